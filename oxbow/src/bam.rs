@@ -3,38 +3,106 @@ use arrow::array::{
     UInt16Array, UInt16Builder, UInt8Array, UInt8Builder,
 };
 use arrow::{
-    datatypes::Int32Type, error::ArrowError, record_batch::RecordBatch,
+    datatypes::{DataType, Field, Int32Type, Schema, SchemaRef},
+    error::ArrowError,
+    ipc::CompressionType,
+    record_batch::RecordBatch,
 };
-use noodles::core::Region;
 use noodles::{bam, bgzf, sam};
+use std::fmt::Write;
+use std::num::NonZeroUsize;
 use std::sync::Arc;
 
-use crate::batch_builder::{write_ipc, BatchBuilder};
+use crate::batch_builder::{write_ipc, BatchBuilder, IpcWriter, INITIAL_CAPACITY};
+use crate::region::{already_returned, merge_regions, parse_region, query_error};
 
 type BufferedReader = std::io::BufReader<std::fs::File>;
 
 /// A BAM reader.
 pub struct BamReader {
-    reader: bam::IndexedReader<bgzf::Reader<BufferedReader>>,
+    reader: bam::Reader<bgzf::Reader<BufferedReader>>,
     header: sam::Header,
+    index: bam::bai::Index,
+    reference_names: StringArray,
+    compression: Option<CompressionType>,
+    /// The position of the first record, right after the header.
+    first_record: bgzf::VirtualPosition,
 }
 
 impl BamReader {
     /// Creates a BAM reader.
     pub fn new(path: &str) -> std::io::Result<Self> {
-        let index = bam::bai::read(format!("{}.bai", path))?;
         let file = std::fs::File::open(path)?;
         let bufreader = std::io::BufReader::with_capacity(1024 * 1024, file);
-        let mut reader = bam::indexed_reader::Builder::default()
-            .set_index(index)
-            .build_from_reader(bufreader)?;
+        Self::from_bgzf_reader(path, bgzf::Reader::new(bufreader))
+    }
+
+    /// Creates a BAM reader that decompresses BGZF blocks on `worker_count` threads.
+    ///
+    /// # Examples
+    ///
+    /// ```no_run
+    /// use std::num::NonZeroUsize;
+    /// use oxbow::bam::BamReader;
+    ///
+    /// let worker_count = NonZeroUsize::new(4).unwrap();
+    /// let mut reader = BamReader::with_worker_count("sample.bam", worker_count).unwrap();
+    /// let ipc = reader.records_to_ipc(None, None).unwrap();
+    /// ```
+    pub fn with_worker_count(path: &str, worker_count: NonZeroUsize) -> std::io::Result<Self> {
+        let file = std::fs::File::open(path)?;
+        let bufreader = std::io::BufReader::with_capacity(1024 * 1024, file);
+        Self::from_bgzf_reader(path, bgzf::Reader::with_worker_count(worker_count, bufreader))
+    }
+
+    fn from_bgzf_reader(
+        path: &str,
+        inner: bgzf::Reader<BufferedReader>,
+    ) -> std::io::Result<Self> {
+        let index = bam::bai::read(format!("{}.bai", path))?;
+        let mut reader = bam::Reader::from(inner);
         let header = reader.read_header()?;
-        Ok(Self { reader, header })
+        let first_record = reader.virtual_position();
+        let reference_names = reference_names(&header);
+        Ok(Self {
+            reader,
+            header,
+            index,
+            reference_names,
+            compression: None,
+            first_record,
+        })
+    }
+
+    /// Sets the codec used to compress the IPC record batch buffers.
+    ///
+    /// IPC output is uncompressed by default. LZ4 and ZSTD compression make the
+    /// output smaller to ship between processes, at the cost of encoding time.
+    ///
+    /// # Examples
+    ///
+    /// ```no_run
+    /// use oxbow::CompressionType;
+    /// use oxbow::bam::BamReader;
+    ///
+    /// let mut reader = BamReader::new("sample.bam").unwrap();
+    /// reader.set_compression(Some(CompressionType::LZ4_FRAME));
+    /// let ipc = reader.records_to_ipc(None, None).unwrap();
+    /// ```
+    pub fn set_compression(&mut self, compression: Option<CompressionType>) {
+        self.compression = compression;
     }
 
     /// Returns the records in the given region as Apache Arrow IPC.
     ///
-    /// If the region is `None`, all records are returned.
+    /// If the region is `None`, all records are returned. If `fields` is given,
+    /// only those columns are returned. Records are still read in full; the
+    /// other columns are just never built. Columns keep the file format's field
+    /// order, whatever the order of `fields`.
+    ///
+    /// An unknown or empty `fields`, a malformed region or an unknown reference
+    /// sequence is an `ArrowError::InvalidArgumentError`. A read error is an
+    /// `ArrowError::IoError`.
     ///
     /// # Examples
     ///
@@ -42,69 +110,179 @@ impl BamReader {
     /// use oxbow::bam::BamReader;
     ///
     /// let mut reader = BamReader::new("sample.bam").unwrap();
-    /// let ipc = reader.records_to_ipc(Some("sq0:1-1000")).unwrap();
+    /// let ipc = reader.records_to_ipc(Some("sq0:1-1000"), None).unwrap();
+    /// let ipc = reader.records_to_ipc(None, Some(&["rname", "pos", "end"])).unwrap();
     /// ```
-    pub fn records_to_ipc(&mut self, region: Option<&str>) -> Result<Vec<u8>, ArrowError> {
-        let batch_builder = BamBatchBuilder::new(1024, &self.header)?;
+    pub fn records_to_ipc(
+        &mut self,
+        region: Option<&str>,
+        fields: Option<&[&str]>,
+    ) -> Result<Vec<u8>, ArrowError> {
+        let batch_builder =
+            BamBatchBuilder::new(INITIAL_CAPACITY, &self.header, &self.reference_names, fields)?;
         if let Some(region) = region {
-            let region: Region = region.parse().unwrap();
+            let region = parse_region(region)?;
             let query = self
                 .reader
-                .query(&self.header, &region)
-                .unwrap()
-                .map(|r| r.unwrap());
-            return write_ipc(query, batch_builder);
+                .query(&self.header, &self.index, &region)
+                .map_err(query_error)?;
+            return write_ipc(query, batch_builder, self.compression);
         }
-        let records = self.reader.records(&self.header).map(|r| r.unwrap());
-        write_ipc(records, batch_builder)
+        // Earlier queries leave the stream anywhere, so rewind to the first record.
+        self.reader.seek(self.first_record)?;
+        let records = self.reader.records(&self.header);
+        write_ipc(records, batch_builder, self.compression)
+    }
+
+    /// Returns the records in each of the given regions as one Apache Arrow IPC file.
+    ///
+    /// The header, index and batch builder are shared by all the region queries.
+    /// Overlapping or adjacent regions on the same reference sequence are merged
+    /// first, and a record spanning the gap between two merged regions is only
+    /// returned for the first, so each record is returned once. Records are
+    /// grouped by reference sequence, in order of first appearance, and sorted by
+    /// position within each. Errors are reported as in `records_to_ipc`.
+    ///
+    /// # Examples
+    ///
+    /// ```no_run
+    /// use oxbow::bam::BamReader;
+    ///
+    /// let mut reader = BamReader::new("sample.bam").unwrap();
+    /// let ipc = reader.regions_to_ipc(&["sq0:1-1000", "sq1:1-1000"], None).unwrap();
+    /// ```
+    pub fn regions_to_ipc(
+        &mut self,
+        regions: &[&str],
+        fields: Option<&[&str]>,
+    ) -> Result<Vec<u8>, ArrowError> {
+        let batch_builder =
+            BamBatchBuilder::new(INITIAL_CAPACITY, &self.header, &self.reference_names, fields)?;
+        let mut writer = IpcWriter::new(batch_builder, self.compression)?;
+        for (region, previous_end) in merge_regions(regions)? {
+            let query = self
+                .reader
+                .query(&self.header, &self.index, &region)
+                .map_err(query_error)?;
+            for record in query {
+                let record = record?;
+                if already_returned(record.alignment_start(), previous_end) {
+                    continue;
+                }
+                writer.push(&record)?;
+            }
+        }
+        writer.finish()
     }
 }
 
+/// Returns the reference sequence names used as the `rname`/`rnext` dictionary.
+fn reference_names(header: &sam::Header) -> StringArray {
+    StringArray::from(
+        header
+            .reference_sequences()
+            .iter()
+            .map(|(rs, _)| Some(rs.as_str()))
+            .collect::<Vec<_>>(),
+    )
+}
+
+/// The BAM columns, in output order.
+const FIELD_NAMES: [&str; 12] = [
+    // spec
+    "qname", "flag", "rname", "pos", "mapq", "cigar", "rnext", "pnext", "tlen", "seq", "qual",
+    // extra
+    "end",
+];
+
+/// Returns the Arrow data type of a BAM column.
+fn data_type(name: &str) -> DataType {
+    match name {
+        "qname" | "cigar" | "seq" | "qual" => DataType::Utf8,
+        "flag" => DataType::UInt16,
+        "rname" | "rnext" => {
+            DataType::Dictionary(Box::new(DataType::Int32), Box::new(DataType::Utf8))
+        }
+        "mapq" => DataType::UInt8,
+        "pos" | "pnext" | "tlen" | "end" => DataType::Int32,
+        _ => unreachable!("unknown BAM field: {}", name),
+    }
+}
+
+/// Builds record batches from BAM records.
+///
+/// Only the selected columns are built; the builders of unselected fields are `None`.
 struct BamBatchBuilder<'a> {
+    schema: SchemaRef,
+    capacity: usize,
     header: &'a sam::Header,
-    qname: GenericStringBuilder<i32>,
-    flag: UInt16Builder,
-    rname: StringDictionaryBuilder<Int32Type>,
-    pos: Int32Builder,
-    mapq: UInt8Builder,
-    cigar: GenericStringBuilder<i32>,
-    rnext: StringDictionaryBuilder<Int32Type>,
-    pnext: Int32Builder,
-    tlen: Int32Builder,
-    seq: GenericStringBuilder<i32>,
-    qual: GenericStringBuilder<i32>,
-    end: Int32Builder,
+    categories: &'a StringArray,
+    qname: Option<GenericStringBuilder<i32>>,
+    flag: Option<UInt16Builder>,
+    rname: Option<StringDictionaryBuilder<Int32Type>>,
+    pos: Option<Int32Builder>,
+    mapq: Option<UInt8Builder>,
+    cigar: Option<GenericStringBuilder<i32>>,
+    rnext: Option<StringDictionaryBuilder<Int32Type>>,
+    pnext: Option<Int32Builder>,
+    tlen: Option<Int32Builder>,
+    seq: Option<GenericStringBuilder<i32>>,
+    qual: Option<GenericStringBuilder<i32>>,
+    end: Option<Int32Builder>,
 }
 
 impl<'a> BamBatchBuilder<'a> {
-    pub fn new(capacity: usize, header: &'a sam::Header) -> Result<Self, ArrowError> {
-        let categories = StringArray::from(
-            header
-                .reference_sequences()
+    /// Creates a batch builder for the given fields, or for all fields if `fields` is `None`.
+    pub fn new(
+        capacity: usize,
+        header: &'a sam::Header,
+        categories: &'a StringArray,
+        fields: Option<&[&str]>,
+    ) -> Result<Self, ArrowError> {
+        if fields.map_or(false, |fields| fields.is_empty()) {
+            return Err(ArrowError::InvalidArgumentError(
+                "no BAM fields selected".to_string(),
+            ));
+        }
+        if let Some(field) = fields
+            .unwrap_or_default()
+            .iter()
+            .find(|field| !FIELD_NAMES.contains(*field))
+        {
+            return Err(ArrowError::InvalidArgumentError(format!(
+                "invalid BAM field: {}",
+                field
+            )));
+        }
+        let selected =
+            |name: &str| fields.map_or(true, |fields| fields.iter().any(|field| *field == name));
+        let dictionary = || {
+            StringDictionaryBuilder::<Int32Type>::new_with_dictionary(capacity, categories)
+        };
+        let schema = Schema::new(
+            FIELD_NAMES
                 .iter()
-                .map(|(rs, _)| Some(rs.as_str()))
+                .filter(|name| selected(**name))
+                .map(|name| Field::new(*name, data_type(*name), true))
                 .collect::<Vec<_>>(),
         );
         Ok(Self {
+            schema: Arc::new(schema),
+            capacity,
             header,
-            qname: GenericStringBuilder::<i32>::new(),
-            flag: UInt16Array::builder(capacity),
-            rname: StringDictionaryBuilder::<Int32Type>::new_with_dictionary(
-                capacity,
-                &categories,
-            )?,
-            pos: Int32Array::builder(capacity),
-            mapq: UInt8Array::builder(capacity),
-            cigar: GenericStringBuilder::<i32>::new(),
-            rnext: StringDictionaryBuilder::<Int32Type>::new_with_dictionary(
-                capacity,
-                &categories,
-            )?,
-            pnext: Int32Array::builder(capacity),
-            tlen: Int32Array::builder(capacity),
-            seq: GenericStringBuilder::<i32>::new(),
-            qual: GenericStringBuilder::<i32>::new(),
-            end: Int32Array::builder(capacity),
+            categories,
+            qname: selected("qname").then(GenericStringBuilder::<i32>::new),
+            flag: selected("flag").then(|| UInt16Array::builder(capacity)),
+            rname: selected("rname").then(dictionary).transpose()?,
+            pos: selected("pos").then(|| Int32Array::builder(capacity)),
+            mapq: selected("mapq").then(|| UInt8Array::builder(capacity)),
+            cigar: selected("cigar").then(GenericStringBuilder::<i32>::new),
+            rnext: selected("rnext").then(dictionary).transpose()?,
+            pnext: selected("pnext").then(|| Int32Array::builder(capacity)),
+            tlen: selected("tlen").then(|| Int32Array::builder(capacity)),
+            seq: selected("seq").then(GenericStringBuilder::<i32>::new),
+            qual: selected("qual").then(GenericStringBuilder::<i32>::new),
+            end: selected("end").then(|| Int32Array::builder(capacity)),
         })
     }
 }
@@ -112,52 +290,117 @@ impl<'a> BamBatchBuilder<'a> {
 impl<'a> BatchBuilder for BamBatchBuilder<'a> {
     type Record = sam::alignment::Record;
 
-    fn push(&mut self, record: &Self::Record) {
-        self.qname.append_option(record.read_name());
-        self.flag.append_value(record.flags().bits());
-        let rname = match record.reference_sequence(self.header) {
-            Some(Ok((name, _))) => Some(name.as_str()),
-            _ => None,
-        };
-        self.rname.append_option(rname);
-        self.pos
-            .append_option(record.alignment_start().map(|x| x.get() as i32));
-        self.mapq
-            .append_option(record.mapping_quality().map(|x| x.get()));
-        self.cigar.append_value(record.cigar().to_string());
-        let rnext = match record.mate_reference_sequence(self.header) {
-            Some(Ok((name, _))) => Some(name.as_str()),
-            _ => None,
-        };
-        self.rnext.append_option(rnext);
-        self.pnext
-            .append_option(record.mate_alignment_start().map(|x| x.get() as i32));
-        self.tlen.append_value(record.template_length());
-        self.seq.append_value(record.sequence().to_string());
-        self.qual.append_value(record.quality_scores().to_string());
+    fn push(&mut self, record: &Self::Record) -> Result<(), ArrowError> {
+        if let Some(qname) = &mut self.qname {
+            qname.append_option(record.read_name());
+        }
+        if let Some(flag) = &mut self.flag {
+            flag.append_value(record.flags().bits());
+        }
+        if let Some(rname) = &mut self.rname {
+            let name = match record.reference_sequence(self.header) {
+                Some(Ok((name, _))) => Some(name.as_str()),
+                _ => None,
+            };
+            rname.append_option(name);
+        }
+        if let Some(pos) = &mut self.pos {
+            pos.append_option(record.alignment_start().map(|x| x.get() as i32));
+        }
+        if let Some(mapq) = &mut self.mapq {
+            mapq.append_option(record.mapping_quality().map(|x| x.get()));
+        }
+        // Formatted fields are written straight into the builder's value buffer and
+        // committed with an empty `append_value`, avoiding a `String` per record.
+        if let Some(cigar) = &mut self.cigar {
+            write!(cigar, "{}", record.cigar()).unwrap();
+            cigar.append_value("");
+        }
+        if let Some(rnext) = &mut self.rnext {
+            let name = match record.mate_reference_sequence(self.header) {
+                Some(Ok((name, _))) => Some(name.as_str()),
+                _ => None,
+            };
+            rnext.append_option(name);
+        }
+        if let Some(pnext) = &mut self.pnext {
+            pnext.append_option(record.mate_alignment_start().map(|x| x.get() as i32));
+        }
+        if let Some(tlen) = &mut self.tlen {
+            tlen.append_value(record.template_length());
+        }
+        if let Some(seq) = &mut self.seq {
+            write!(seq, "{}", record.sequence()).unwrap();
+            seq.append_value("");
+        }
+        if let Some(qual) = &mut self.qual {
+            write!(qual, "{}", record.quality_scores()).unwrap();
+            qual.append_value("");
+        }
+
+        // extra
+        if let Some(end) = &mut self.end {
+            end.append_option(record.alignment_end().map(|x| x.get() as i32));
+        }
+        Ok(())
+    }
 
+    fn finish(&mut self) -> Result<RecordBatch, ArrowError> {
+        let mut columns: Vec<ArrayRef> = Vec::with_capacity(self.schema.fields().len());
+        // spec
+        if let Some(qname) = &mut self.qname {
+            columns.push(Arc::new(qname.finish()) as ArrayRef);
+        }
+        if let Some(flag) = &mut self.flag {
+            columns.push(Arc::new(flag.finish()) as ArrayRef);
+        }
+        if let Some(rname) = &mut self.rname {
+            columns.push(Arc::new(rname.finish()) as ArrayRef);
+        }
+        if let Some(pos) = &mut self.pos {
+            columns.push(Arc::new(pos.finish()) as ArrayRef);
+        }
+        if let Some(mapq) = &mut self.mapq {
+            columns.push(Arc::new(mapq.finish()) as ArrayRef);
+        }
+        if let Some(cigar) = &mut self.cigar {
+            columns.push(Arc::new(cigar.finish()) as ArrayRef);
+        }
+        if let Some(rnext) = &mut self.rnext {
+            columns.push(Arc::new(rnext.finish()) as ArrayRef);
+        }
+        if let Some(pnext) = &mut self.pnext {
+            columns.push(Arc::new(pnext.finish()) as ArrayRef);
+        }
+        if let Some(tlen) = &mut self.tlen {
+            columns.push(Arc::new(tlen.finish()) as ArrayRef);
+        }
+        if let Some(seq) = &mut self.seq {
+            columns.push(Arc::new(seq.finish()) as ArrayRef);
+        }
+        if let Some(qual) = &mut self.qual {
+            columns.push(Arc::new(qual.finish()) as ArrayRef);
+        }
         // extra
-        self.end
-            .append_option(record.alignment_end().map(|x| x.get() as i32));
-    }
-
-    fn finish(mut self) -> Result<RecordBatch, ArrowError> {
-        RecordBatch::try_from_iter(vec![
-            // spec
-            ("qname", Arc::new(self.qname.finish()) as ArrayRef),
-            ("flag", Arc::new(self.flag.finish()) as ArrayRef),
-            ("rname", Arc::new(self.rname.finish()) as ArrayRef),
-            ("pos", Arc::new(self.pos.finish()) as ArrayRef),
-            ("mapq", Arc::new(self.mapq.finish()) as ArrayRef),
-            ("cigar", Arc::new(self.cigar.finish()) as ArrayRef),
-            ("rnext", Arc::new(self.rnext.finish()) as ArrayRef),
-            ("pnext", Arc::new(self.pnext.finish()) as ArrayRef),
-            ("tlen", Arc::new(self.tlen.finish()) as ArrayRef),
-            ("seq", Arc::new(self.seq.finish()) as ArrayRef),
-            ("qual", Arc::new(self.qual.finish()) as ArrayRef),
-            // extra
-            ("end", Arc::new(self.end.finish()) as ArrayRef),
-        ])
+        if let Some(end) = &mut self.end {
+            columns.push(Arc::new(end.finish()) as ArrayRef);
+        }
+        let batch = RecordBatch::try_new(self.schema.clone(), columns)?;
+        // Finishing a dictionary builder discards its values. Reseed them so
+        // that every batch in the IPC file shares the same dictionary.
+        if self.rname.is_some() {
+            self.rname = Some(StringDictionaryBuilder::<Int32Type>::new_with_dictionary(
+                self.capacity,
+                self.categories,
+            )?);
+        }
+        if self.rnext.is_some() {
+            self.rnext = Some(StringDictionaryBuilder::<Int32Type>::new_with_dictionary(
+                self.capacity,
+                self.categories,
+            )?);
+        }
+        Ok(batch)
     }
 }
 
@@ -167,11 +410,17 @@ mod tests {
     use arrow::ipc::reader::FileReader;
     use arrow::record_batch::RecordBatch;
 
-    fn read_record_batch(region: Option<&str>) -> RecordBatch {
+    fn sample_path() -> String {
         let mut dir = std::path::PathBuf::from(env!("CARGO_MANIFEST_DIR"));
         dir.push("fixtures/sample.bam");
-        let mut reader = BamReader::new(dir.to_str().unwrap()).unwrap();
-        let ipc = reader.records_to_ipc(region).unwrap();
+        dir.to_str().unwrap().to_string()
+    }
+
+    fn sample_reader() -> BamReader {
+        BamReader::new(&sample_path()).unwrap()
+    }
+
+    fn read_record_batch(ipc: Vec<u8>) -> RecordBatch {
         let cursor = std::io::Cursor::new(ipc);
         let mut arrow_reader = FileReader::try_new(cursor, None).unwrap();
         // make sure we have one batch
@@ -179,21 +428,119 @@ mod tests {
         arrow_reader.next().unwrap().unwrap()
     }
 
+    fn field_names(schema: &Schema) -> Vec<&str> {
+        schema.fields().iter().map(|f| f.name().as_str()).collect()
+    }
+
     #[test]
     fn test_read_all() {
-        let record_batch = read_record_batch(None);
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
         assert_eq!(record_batch.num_rows(), 6);
     }
 
     #[test]
     fn test_region_full() {
-        let record_batch = read_record_batch(Some("chr1"));
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(Some("chr1"), None).unwrap());
         assert_eq!(record_batch.num_rows(), 4);
     }
 
     #[test]
     fn rest_region_partial() {
-        let record_batch = read_record_batch(Some("chr1:1-100000"));
+        let mut reader = sample_reader();
+        let ipc = reader.records_to_ipc(Some("chr1:1-100000"), None).unwrap();
+        let record_batch = read_record_batch(ipc);
         assert_eq!(record_batch.num_rows(), 2);
     }
+
+    #[test]
+    fn test_read_all_with_worker_count() {
+        let worker_count = NonZeroUsize::new(2).unwrap();
+        let mut reader = BamReader::with_worker_count(&sample_path(), worker_count).unwrap();
+        let record_batch = read_record_batch(reader.records_to_ipc(Some("chr1"), None).unwrap());
+        assert_eq!(record_batch.num_rows(), 4);
+    }
+
+    #[test]
+    fn test_fields() {
+        let mut reader = sample_reader();
+        let ipc = reader
+            .records_to_ipc(None, Some(&["rname", "pos", "end"]))
+            .unwrap();
+        let record_batch = read_record_batch(ipc);
+        assert_eq!(field_names(&record_batch.schema()), vec!["rname", "pos", "end"]);
+        assert_eq!(record_batch.num_rows(), 6);
+    }
+
+    #[test]
+    fn test_regions() {
+        let mut reader = sample_reader();
+        let ipc = reader
+            .regions_to_ipc(&["chr1:1-100000", "chr1"], None)
+            .unwrap();
+        let record_batch = read_record_batch(ipc);
+        // the regions overlap, so chr1 records are only returned once
+        assert_eq!(record_batch.num_rows(), 4);
+    }
+
+    #[test]
+    fn test_regions_gap() {
+        let mut reader = sample_reader();
+        // both chr1 reads at 10145-10183 span the gap between the regions
+        let ipc = reader
+            .regions_to_ipc(&["chr1:10000-10150", "chr1:10170-20000"], None)
+            .unwrap();
+        let record_batch = read_record_batch(ipc);
+        assert_eq!(record_batch.num_rows(), 2);
+    }
+
+    #[test]
+    fn test_invalid_field() {
+        let mut reader = sample_reader();
+        assert!(reader.records_to_ipc(None, Some(&["nope"])).is_err());
+        assert!(reader.records_to_ipc(None, Some(&[])).is_err());
+    }
+
+    #[test]
+    fn test_field_order() {
+        let mut reader = sample_reader();
+        let ipc = reader.records_to_ipc(None, Some(&["end", "rname"])).unwrap();
+        let record_batch = read_record_batch(ipc);
+        // columns keep the BAM field order
+        assert_eq!(field_names(&record_batch.schema()), vec!["rname", "end"]);
+    }
+
+    #[test]
+    fn test_read_all_twice() {
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 6);
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 6);
+    }
+
+    #[test]
+    fn test_read_all_after_region() {
+        let mut reader = sample_reader();
+        let ipc = reader.records_to_ipc(Some("chr1:1-100000"), None).unwrap();
+        assert_eq!(read_record_batch(ipc).num_rows(), 2);
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 6);
+    }
+
+    #[test]
+    fn test_invalid_region() {
+        let mut reader = sample_reader();
+        for region in ["", "chr99"] {
+            assert!(matches!(
+                reader.records_to_ipc(Some(region), None),
+                Err(ArrowError::InvalidArgumentError(_))
+            ));
+            assert!(matches!(
+                reader.regions_to_ipc(&[region], None),
+                Err(ArrowError::InvalidArgumentError(_))
+            ));
+        }
+    }
 }
@@ -1,21 +1,159 @@
 use arrow::error::ArrowError;
 use arrow::record_batch::RecordBatch;
-use arrow::ipc::writer::FileWriter;
+use arrow::ipc::writer::{FileWriter, IpcWriteOptions};
+use arrow::ipc::CompressionType;
+
+/// The number of records written per record batch.
+pub const BATCH_SIZE: usize = 65536;
+
+/// The number of rows reserved up front by column builders.
+///
+/// Builders grow as records are pushed, so small region queries don't pay
+/// for a full `BATCH_SIZE` reservation in every column.
+pub const INITIAL_CAPACITY: usize = 1024;
 
 pub trait BatchBuilder {
     type Record;
-    fn push(&mut self, record: &Self::Record);
-    fn finish(self) -> Result<RecordBatch, ArrowError>;
+    fn push(&mut self, record: &Self::Record) -> Result<(), ArrowError>;
+    /// Builds a record batch from the pushed records and resets the builder.
+    fn finish(&mut self) -> Result<RecordBatch, ArrowError>;
 }
 
+/// Writes the records as Apache Arrow IPC, `BATCH_SIZE` records per batch.
+///
+/// Only one batch is held in memory at a time. At least one (possibly empty)
+/// batch is always written. If `compression` is given, the batch buffers are
+/// compressed with that codec. A read error stops the write and is returned as
+/// an `ArrowError::IoError`.
 pub fn write_ipc<T>(
-    records: impl Iterator<Item = T>,
-    mut batch_builder: impl BatchBuilder<Record = T>,
+    records: impl Iterator<Item = std::io::Result<T>>,
+    batch_builder: impl BatchBuilder<Record = T>,
+    compression: Option<CompressionType>,
 ) -> Result<Vec<u8>, ArrowError> {
-    records.for_each(|record| batch_builder.push(&record));
-    let batch = batch_builder.finish()?;
-    let mut writer = FileWriter::try_new(Vec::new(), &batch.schema())?;
-    writer.write(&batch)?;
-    writer.finish()?;
-    writer.into_inner()
+    let mut writer = IpcWriter::new(batch_builder, compression)?;
+    for record in records {
+        writer.push(&record?)?;
+    }
+    writer.finish()
+}
+
+/// Incrementally writes records as Apache Arrow IPC, `BATCH_SIZE` records per batch.
+///
+/// Unlike `write_ipc`, records can be pushed from several iterators in turn,
+/// e.g. one query per region on the same reader.
+pub struct IpcWriter<B: BatchBuilder> {
+    batch_builder: B,
+    writer: Option<FileWriter<Vec<u8>>>,
+    options: IpcWriteOptions,
+    num_rows: usize,
+}
+
+impl<B: BatchBuilder> IpcWriter<B> {
+    pub fn new(batch_builder: B, compression: Option<CompressionType>) -> Result<Self, ArrowError> {
+        let options = IpcWriteOptions::default().try_with_compression(compression)?;
+        Ok(Self {
+            batch_builder,
+            writer: None,
+            options,
+            num_rows: 0,
+        })
+    }
+
+    /// Pushes a record, writing out a batch once `BATCH_SIZE` records are buffered.
+    pub fn push(&mut self, record: &B::Record) -> Result<(), ArrowError> {
+        self.batch_builder.push(record)?;
+        self.num_rows += 1;
+        if self.num_rows == BATCH_SIZE {
+            self.write_batch()?;
+        }
+        Ok(())
+    }
+
+    /// Writes the remaining records and returns the IPC file.
+    pub fn finish(mut self) -> Result<Vec<u8>, ArrowError> {
+        if self.num_rows > 0 || self.writer.is_none() {
+            self.write_batch()?;
+        }
+        let mut writer = self.writer.expect("a batch has been written");
+        writer.finish()?;
+        writer.into_inner()
+    }
+
+    fn write_batch(&mut self) -> Result<(), ArrowError> {
+        let batch = self.batch_builder.finish()?;
+        self.num_rows = 0;
+        if self.writer.is_none() {
+            self.writer = Some(FileWriter::try_new_with_options(
+                Vec::new(),
+                &batch.schema(),
+                self.options.clone(),
+            )?);
+        }
+        self.writer.as_mut().unwrap().write(&batch)
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use arrow::array::{ArrayRef, Int32Builder};
+    use arrow::ipc::reader::FileReader;
+    use std::sync::Arc;
+
+    struct IntBatchBuilder {
+        value: Int32Builder,
+    }
+
+    impl BatchBuilder for IntBatchBuilder {
+        type Record = i32;
+
+        fn push(&mut self, record: &Self::Record) -> Result<(), ArrowError> {
+            self.value.append_value(*record);
+            Ok(())
+        }
+
+        fn finish(&mut self) -> Result<RecordBatch, ArrowError> {
+            RecordBatch::try_from_iter(vec![(
+                "value",
+                Arc::new(self.value.finish()) as ArrayRef,
+            )])
+        }
+    }
+
+    fn read_batches(n: usize) -> Vec<RecordBatch> {
+        read_compressed_batches(n, None)
+    }
+
+    fn read_compressed_batches(n: usize, compression: Option<CompressionType>) -> Vec<RecordBatch> {
+        let batch_builder = IntBatchBuilder {
+            value: Int32Builder::new(),
+        };
+        let ipc = write_ipc((0..n as i32).map(Ok), batch_builder, compression).unwrap();
+        let cursor = std::io::Cursor::new(ipc);
+        FileReader::try_new(cursor, None)
+            .unwrap()
+            .map(|batch| batch.unwrap())
+            .collect()
+    }
+
+    #[test]
+    fn test_write_empty() {
+        let batches = read_batches(0);
+        assert_eq!(batches.len(), 1);
+        assert_eq!(batches[0].num_rows(), 0);
+    }
+
+    #[test]
+    fn test_write_in_batches() {
+        let batches = read_batches(2 * BATCH_SIZE + 1);
+        let num_rows: Vec<_> = batches.iter().map(|batch| batch.num_rows()).collect();
+        assert_eq!(num_rows, vec![BATCH_SIZE, BATCH_SIZE, 1]);
+    }
+
+    #[test]
+    fn test_write_compressed() {
+        let batches = read_compressed_batches(BATCH_SIZE + 1, Some(CompressionType::LZ4_FRAME));
+        let num_rows: Vec<_> = batches.iter().map(|batch| batch.num_rows()).collect();
+        assert_eq!(num_rows, vec![BATCH_SIZE, 1]);
+    }
 }
@@ -1,19 +1,16 @@
-use arrow::array::{
-    ArrayRef, Float32Builder, GenericStringBuilder, Int32Builder,
-    StringArray, StringDictionaryBuilder,
-};
-use arrow::{
-    datatypes::Int32Type, error::ArrowError, record_batch::RecordBatch,
-};
+use arrow::array::StringArray;
+use arrow::{error::ArrowError, ipc::CompressionType, record_batch::RecordBatch};
 use byteorder::{LittleEndian, ReadBytesExt};
-use noodles::core::Region;
+use noodles::core::Position;
 use noodles::bcf::header::StringMaps;
 use noodles::{bcf, bgzf, csi, vcf};
-use std::sync::Arc;
+use std::num::NonZeroUsize;
 use std::{ffi::CStr, io};
 use std::io::{Read};
 
-use crate::batch_builder::{write_ipc, BatchBuilder};
+use crate::batch_builder::{write_ipc, BatchBuilder, IpcWriter, INITIAL_CAPACITY};
+use crate::region::{already_returned, merge_regions, parse_region, query_error};
+use crate::vcf::{contig_names, VcfBatchBuilder};
 
 type BufferedReader = std::io::BufReader<std::fs::File>;
 
@@ -79,128 +76,292 @@ pub struct BcfReader {
     header: vcf::Header,
     string_maps: StringMaps,
     index: csi::Index,
+    contig_names: StringArray,
+    compression: Option<CompressionType>,
+    /// The position of the first record, right after the header.
+    first_record: bgzf::VirtualPosition,
 }
 
 impl BcfReader {
     /// Creates a BCF Reader.
     pub fn new(path: &str) -> std::io::Result<Self> {
         let file = std::fs::File::open(path)?;
-        let index = csi::read(format!("{}.csi", path))?;
         let bufreader = std::io::BufReader::with_capacity(1024 * 1024, file);
-        let reader = bcf::Reader::new(bufreader);
+        Self::from_bgzf_reader(path, bgzf::Reader::new(bufreader))
+    }
+
+    /// Creates a BCF reader that decompresses BGZF blocks on `worker_count` threads.
+    ///
+    /// See [`BamReader::with_worker_count`](crate::bam::BamReader::with_worker_count).
+    pub fn with_worker_count(path: &str, worker_count: NonZeroUsize) -> std::io::Result<Self> {
+        let file = std::fs::File::open(path)?;
+        let bufreader = std::io::BufReader::with_capacity(1024 * 1024, file);
+        Self::from_bgzf_reader(path, bgzf::Reader::with_worker_count(worker_count, bufreader))
+    }
 
-        let mut bgzf_reader = std::fs::File::open(path).map(bgzf::Reader::new)?;
-        let (header, string_maps) = read_bcf_header(&mut bgzf_reader)?;
+    fn from_bgzf_reader(
+        path: &str,
+        inner: bgzf::Reader<BufferedReader>,
+    ) -> std::io::Result<Self> {
+        let index = csi::read(format!("{}.csi", path))?;
+        let mut reader = bcf::Reader::from(inner);
+        let (header, string_maps) = read_bcf_header(reader.get_mut())?;
+        let first_record = reader.virtual_position();
+        let contig_names = contig_names(&header);
 
-        Ok(Self { reader, header, string_maps, index })
+        Ok(Self {
+            reader,
+            header,
+            string_maps,
+            index,
+            contig_names,
+            compression: None,
+            first_record,
+        })
+    }
+
+    /// Sets the codec used to compress the IPC record batch buffers.
+    ///
+    /// See [`BamReader::set_compression`](crate::bam::BamReader::set_compression).
+    pub fn set_compression(&mut self, compression: Option<CompressionType>) {
+        self.compression = compression;
     }
 
     /// Returns the records in the given region as Apache Arrow IPC.
     ///
-    /// If the region is `None`, all records are returned.
+    /// If the region is `None`, all records are returned. If `fields` is given,
+    /// only those columns are returned. Records are still read in full; the
+    /// other columns are just never built. Columns keep the file format's field
+    /// order, whatever the order of `fields`.
+    ///
+    /// An unknown or empty `fields`, a malformed region or an unknown reference
+    /// sequence is an `ArrowError::InvalidArgumentError`. A read error is an
+    /// `ArrowError::IoError`.
     ///
     /// # Examples
     ///
-    /// ``no_run
+    /// ```no_run
     /// use oxbow::bcf::BcfReader;
     ///
     /// let mut reader = BcfReader::new("sample.bcf").unwrap();
-    /// let ipc = reader.records_to_ipc(Some("sq0:1-1000")).unwrap();
+    /// let ipc = reader.records_to_ipc(Some("sq0:1-1000"), None).unwrap();
+    /// let ipc = reader.records_to_ipc(None, Some(&["chrom", "pos", "ref", "alt"])).unwrap();
     /// ```
-    pub fn records_to_ipc(&mut self, region: Option<&str>) -> Result<Vec<u8>, ArrowError> {
-        let s = self.string_maps.clone();
-        let batch_builder = BcfBatchBuilder::new(1024, &self.header, &s)?;
-        let string_maps = StringMaps::from(&self.header);
+    pub fn records_to_ipc(
+        &mut self,
+        region: Option<&str>,
+        fields: Option<&[&str]>,
+    ) -> Result<Vec<u8>, ArrowError> {
+        let batch_builder = BcfBatchBuilder::new(
+            INITIAL_CAPACITY,
+            &self.header,
+            &self.string_maps,
+            &self.contig_names,
+            fields,
+        )?;
         if let Some(region) = region {
-            let region: Region = region.parse().unwrap();
+            let region = parse_region(region)?;
             let query = self
                 .reader
-                .query(string_maps.contigs(), &self.index, &region)
-                .unwrap()
-                .map(|r| r.unwrap());
-            return write_ipc(query, batch_builder);
+                .query(self.string_maps.contigs(), &self.index, &region)
+                .map_err(query_error)?;
+            return write_ipc(query, batch_builder, self.compression);
         }
-        let records = self.reader.records().map(|r| r.unwrap());
-        write_ipc(records, batch_builder)
+        // Earlier queries leave the stream anywhere, so rewind to the first record.
+        self.reader.seek(self.first_record)?;
+        let records = self.reader.records();
+        write_ipc(records, batch_builder, self.compression)
+    }
+
+    /// Returns the records in each of the given regions as one Apache Arrow IPC file.
+    ///
+    /// Overlapping or adjacent regions on the same reference sequence are merged
+    /// first, and a record spanning the gap between two merged regions is only
+    /// returned for the first, so each record is returned once. Records are
+    /// grouped by reference sequence, in order of first appearance, and sorted by
+    /// position within each. Errors are reported as in `records_to_ipc`.
+    ///
+    /// # Examples
+    ///
+    /// ```no_run
+    /// use oxbow::bcf::BcfReader;
+    ///
+    /// let mut reader = BcfReader::new("sample.bcf").unwrap();
+    /// let ipc = reader.regions_to_ipc(&["sq0:1-1000", "sq1:1-1000"], None).unwrap();
+    /// ```
+    pub fn regions_to_ipc(
+        &mut self,
+        regions: &[&str],
+        fields: Option<&[&str]>,
+    ) -> Result<Vec<u8>, ArrowError> {
+        let batch_builder = BcfBatchBuilder::new(
+            INITIAL_CAPACITY,
+            &self.header,
+            &self.string_maps,
+            &self.contig_names,
+            fields,
+        )?;
+        let mut writer = IpcWriter::new(batch_builder, self.compression)?;
+        for (region, previous_end) in merge_regions(regions)? {
+            let query = self
+                .reader
+                .query(self.string_maps.contigs(), &self.index, &region)
+                .map_err(query_error)?;
+            for record in query {
+                let record = record?;
+                if already_returned(Position::new(usize::from(record.position())), previous_end) {
+                    continue;
+                }
+                writer.push(&record)?;
+            }
+        }
+        writer.finish()
     }
 }
 
-struct BcfBatchBuilder {
-    chrom: StringDictionaryBuilder<Int32Type>,
-    pos: Int32Builder,
-    id: GenericStringBuilder<i32>,
-    ref_: GenericStringBuilder<i32>,
-    alt: GenericStringBuilder<i32>,
-    qual: Float32Builder,
-    filter: GenericStringBuilder<i32>,
-    info: GenericStringBuilder<i32>,
-    format: GenericStringBuilder<i32>,
-    header: vcf::Header,
-    string_maps: StringMaps,
+/// Builds record batches from BCF records.
+///
+/// Each record is converted to a VCF record, then pushed to a `VcfBatchBuilder`.
+struct BcfBatchBuilder<'a> {
+    inner: VcfBatchBuilder<'a>,
+    header: &'a vcf::Header,
+    string_maps: &'a StringMaps,
 }
 
-impl BcfBatchBuilder {
-    pub fn new(capacity: usize, header: &vcf::Header, string_maps: &StringMaps) -> Result<Self, ArrowError> {
-        let categories = StringArray::from(
-            header
-                .contigs()
-                .keys()
-                .map(|k| k.to_string())
-                .collect::<Vec<_>>(),
-        );
+impl<'a> BcfBatchBuilder<'a> {
+    /// Creates a batch builder for the given fields, or for all fields if `fields` is `None`.
+    pub fn new(
+        capacity: usize,
+        header: &'a vcf::Header,
+        string_maps: &'a StringMaps,
+        categories: &'a StringArray,
+        fields: Option<&[&str]>,
+    ) -> Result<Self, ArrowError> {
         Ok(Self {
-            chrom: StringDictionaryBuilder::<Int32Type>::new_with_dictionary(
-                capacity,
-                &categories,
-            )?,
-            pos: Int32Builder::with_capacity(capacity),
-            id: GenericStringBuilder::<i32>::new(),
-            ref_: GenericStringBuilder::<i32>::new(),
-            alt: GenericStringBuilder::<i32>::new(),
-            qual: Float32Builder::with_capacity(capacity),
-            filter: GenericStringBuilder::<i32>::new(),
-            info: GenericStringBuilder::<i32>::new(),
-            format: GenericStringBuilder::<i32>::new(),
-            header: header.clone(),
-            string_maps: string_maps.clone(),
+            inner: VcfBatchBuilder::new(capacity, categories, fields)?,
+            header,
+            string_maps,
         })
     }
 }
 
-impl BatchBuilder for BcfBatchBuilder {
+impl<'a> BatchBuilder for BcfBatchBuilder<'a> {
     type Record = bcf::record::Record;
 
-    fn push(&mut self, record: &Self::Record) {
-
-        let vcf_record = record.try_into_vcf_record(
-            &self.header, &self.string_maps
-        ).unwrap();
-
-        self.chrom.append_value(vcf_record.chromosome().to_string());
-        self.pos.append_value(usize::from(vcf_record.position()) as i32);
-        self.id.append_value(vcf_record.ids().to_string());
-        self.ref_.append_value(vcf_record.reference_bases().to_string());
-        self.alt.append_value(vcf_record.alternate_bases().to_string());
-        self.qual
-            .append_option(vcf_record.quality_score().map(f32::from));
-        self.filter
-            .append_option(vcf_record.filters().map(|f| f.to_string()));
-        self.info.append_value(vcf_record.info().to_string());
-        self.format.append_value(vcf_record.format().to_string());
-    }
-
-    fn finish(mut self) -> Result<RecordBatch, ArrowError> {
-        RecordBatch::try_from_iter(vec![
-            // spec
-            ("chrom", Arc::new(self.chrom.finish()) as ArrayRef),
-            ("pos", Arc::new(self.pos.finish()) as ArrayRef),
-            ("id", Arc::new(self.id.finish()) as ArrayRef),
-            ("ref", Arc::new(self.ref_.finish()) as ArrayRef),
-            ("alt", Arc::new(self.alt.finish()) as ArrayRef),
-            ("qual", Arc::new(self.qual.finish()) as ArrayRef),
-            ("filter", Arc::new(self.filter.finish()) as ArrayRef),
-            ("info", Arc::new(self.info.finish()) as ArrayRef),
-            ("format", Arc::new(self.format.finish()) as ArrayRef),
-        ])
+    fn push(&mut self, record: &Self::Record) -> Result<(), ArrowError> {
+        let vcf_record = record.try_into_vcf_record(self.header, self.string_maps)?;
+        self.inner.push(&vcf_record)
+    }
+
+    fn finish(&mut self) -> Result<RecordBatch, ArrowError> {
+        self.inner.finish()
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use arrow::array::Array;
+    use arrow::datatypes::Schema;
+    use arrow::ipc::reader::FileReader;
+
+    fn sample_path() -> String {
+        let mut dir = std::path::PathBuf::from(env!("CARGO_MANIFEST_DIR"));
+        dir.push("fixtures/sample.bcf");
+        dir.to_str().unwrap().to_string()
+    }
+
+    fn sample_reader() -> BcfReader {
+        BcfReader::new(&sample_path()).unwrap()
+    }
+
+    fn read_record_batch(ipc: Vec<u8>) -> RecordBatch {
+        let cursor = std::io::Cursor::new(ipc);
+        let mut arrow_reader = FileReader::try_new(cursor, None).unwrap();
+        // make sure we have one batch
+        assert_eq!(arrow_reader.num_batches(), 1);
+        arrow_reader.next().unwrap().unwrap()
+    }
+
+    fn field_names(schema: &Schema) -> Vec<&str> {
+        schema.fields().iter().map(|f| f.name().as_str()).collect()
+    }
+
+    #[test]
+    fn test_read_all() {
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+    }
+
+    #[test]
+    fn test_read_all_twice() {
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+    }
+
+    #[test]
+    fn test_read_all_after_region() {
+        let mut reader = sample_reader();
+        let ipc = reader.records_to_ipc(Some("sq0:50-150"), None).unwrap();
+        assert_eq!(read_record_batch(ipc).num_rows(), 1);
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+    }
+
+    #[test]
+    fn test_region() {
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(Some("sq1"), None).unwrap());
+        assert_eq!(record_batch.num_rows(), 2);
+    }
+
+    #[test]
+    fn test_fields() {
+        let mut reader = sample_reader();
+        let ipc = reader
+            .records_to_ipc(Some("sq1"), Some(&["filter", "chrom", "pos"]))
+            .unwrap();
+        let record_batch = read_record_batch(ipc);
+        assert_eq!(field_names(&record_batch.schema()), vec!["chrom", "pos", "filter"]);
+        let filter = record_batch
+            .column(2)
+            .as_any()
+            .downcast_ref::<StringArray>()
+            .unwrap();
+        assert_eq!(filter.iter().collect::<Vec<_>>(), vec![Some("q10"), Some("PASS")]);
+    }
+
+    #[test]
+    fn test_regions() {
+        let mut reader = sample_reader();
+        // the deletion at sq0:100-109 spans the gap between the regions
+        let ipc = reader
+            .regions_to_ipc(&["sq0:105-200", "sq0:1-102", "sq1"], None)
+            .unwrap();
+        let record_batch = read_record_batch(ipc);
+        assert_eq!(record_batch.num_rows(), 4);
+    }
+
+    #[test]
+    fn test_read_with_worker_count() {
+        let worker_count = NonZeroUsize::new(2).unwrap();
+        let mut reader = BcfReader::with_worker_count(&sample_path(), worker_count).unwrap();
+        let record_batch = read_record_batch(reader.records_to_ipc(Some("sq0"), None).unwrap());
+        assert_eq!(record_batch.num_rows(), 3);
+    }
+
+    #[test]
+    fn test_invalid_region() {
+        let mut reader = sample_reader();
+        for region in ["", "sq99"] {
+            assert!(matches!(
+                reader.records_to_ipc(Some(region), None),
+                Err(ArrowError::InvalidArgumentError(_))
+            ));
+        }
     }
 }
@@ -8,7 +8,7 @@
 //! use oxbow::bam::BamReader;
 //!
 //! let mut reader = BamReader::new("sample.bam").unwrap();
-//! let ipc = reader.records_to_ipc(None).unwrap();
+//! let ipc = reader.records_to_ipc(None, None).unwrap();
 //! ```
 //!
 //! ## Query records
@@ -19,11 +19,15 @@
 //! use oxbow::bam::BamReader;
 //!
 //! let mut reader = BamReader::new("sample.bam").unwrap();
-//! let ipc = reader.records_to_ipc(Some("chr1:1-100000")).unwrap();
+//! let ipc = reader.records_to_ipc(Some("chr1:1-100000"), None).unwrap();
 //! ```
 //!
 
 pub mod bam;
 mod batch_builder;
+mod region;
 pub mod vcf;
 pub mod bcf;
+
+pub use arrow::error::ArrowError;
+pub use arrow::ipc::CompressionType;
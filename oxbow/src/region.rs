@@ -0,0 +1,146 @@
+use arrow::error::ArrowError;
+use noodles::core::{region::Interval, Position, Region};
+use std::collections::HashMap;
+use std::io;
+
+/// Parses a region, e.g. `sq0:1-1000`.
+///
+/// A malformed region is an `ArrowError::InvalidArgumentError`.
+pub(crate) fn parse_region(region: &str) -> Result<Region, ArrowError> {
+    region.parse().map_err(|e| {
+        ArrowError::InvalidArgumentError(format!("invalid region: {}: {}", region, e))
+    })
+}
+
+/// Converts an error from starting a region query into an Arrow error.
+///
+/// noodles reports a reference sequence missing from the header or index as
+/// `InvalidInput`. That is the caller's mistake, so it becomes an
+/// `ArrowError::InvalidArgumentError`; anything else is an `ArrowError::IoError`.
+pub(crate) fn query_error(error: io::Error) -> ArrowError {
+    match error.kind() {
+        io::ErrorKind::InvalidInput => ArrowError::InvalidArgumentError(error.to_string()),
+        _ => ArrowError::from(error),
+    }
+}
+
+/// Parses the regions and merges those that overlap or abut on the same reference sequence.
+///
+/// Reference sequences keep the order in which they first appear, and the merged
+/// regions of each one are sorted by start position, so the index chunks of
+/// nearby regions are read in file order.
+///
+/// Each merged region comes with the end of the previous merged region on the
+/// same reference sequence, if any. A record spanning the gap between the two is
+/// returned by both queries; skip it in the second one with `already_returned`.
+pub(crate) fn merge_regions(
+    regions: &[&str],
+) -> Result<Vec<(Region, Option<Position>)>, ArrowError> {
+    let mut names: Vec<String> = Vec::new();
+    let mut indices: HashMap<String, usize> = HashMap::new();
+    let mut bounds: Vec<Vec<(Position, Option<Position>)>> = Vec::new();
+    for region in regions {
+        let region = parse_region(region)?;
+        let interval = region.interval();
+        let bound = (interval.start().unwrap_or(Position::MIN), interval.end());
+        match indices.get(region.name()) {
+            Some(&i) => bounds[i].push(bound),
+            None => {
+                indices.insert(region.name().to_string(), names.len());
+                names.push(region.name().to_string());
+                bounds.push(vec![bound]);
+            }
+        }
+    }
+
+    let mut merged = Vec::new();
+    for (name, mut bounds) in names.into_iter().zip(bounds) {
+        bounds.sort_by_key(|(start, _)| *start);
+        let mut current = bounds[0];
+        let mut previous_end = None;
+        for (start, end) in bounds.into_iter().skip(1) {
+            match current.1 {
+                Some(current_end) if usize::from(start) > usize::from(current_end) + 1 => {
+                    merged.push((new_region(&name, current), previous_end));
+                    previous_end = Some(current_end);
+                    current = (start, end);
+                }
+                Some(current_end) => current.1 = end.map(|end| end.max(current_end)),
+                // the current region already extends to the end of the sequence
+                None => {}
+            }
+        }
+        merged.push((new_region(&name, current), previous_end));
+    }
+    Ok(merged)
+}
+
+/// Returns whether a record starting at `start` was already returned by the
+/// previous merged region, which ends at `previous_end`.
+pub(crate) fn already_returned(start: Option<Position>, previous_end: Option<Position>) -> bool {
+    matches!((start, previous_end), (Some(start), Some(end)) if start <= end)
+}
+
+fn new_region(name: &str, (start, end): (Position, Option<Position>)) -> Region {
+    let interval: Interval = match end {
+        Some(end) => (start..=end).into(),
+        None => (start..).into(),
+    };
+    Region::new(name, interval)
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn merge(regions: &[&str]) -> Vec<String> {
+        merge_regions(regions)
+            .unwrap()
+            .iter()
+            .map(|(region, _)| region.to_string())
+            .collect()
+    }
+
+    #[test]
+    fn test_merge_overlapping() {
+        let merged = merge(&["chr1:50-200", "chr2:1-10", "chr1:1-100", "chr1:201-300"]);
+        assert_eq!(merged, vec!["chr1:1-300", "chr2:1-10"]);
+    }
+
+    #[test]
+    fn test_merge_disjoint() {
+        let merged = merge(&["chr1:500-600", "chr1:1-100"]);
+        assert_eq!(merged, vec!["chr1:1-100", "chr1:500-600"]);
+    }
+
+    #[test]
+    fn test_merge_unbounded() {
+        let merged = merge_regions(&["chr1:1-100000", "chr1"]).unwrap();
+        assert_eq!(merged.len(), 1);
+        assert_eq!(merged[0].0.interval().end(), None);
+    }
+
+    #[test]
+    fn test_previous_end() {
+        let merged = merge_regions(&["chr1:500-600", "chr2:1-10", "chr1:1-100"]).unwrap();
+        let previous_ends: Vec<_> = merged.iter().map(|(_, end)| end.map(usize::from)).collect();
+        assert_eq!(previous_ends, vec![None, Some(100), None]);
+    }
+
+    #[test]
+    fn test_merge_invalid() {
+        assert!(matches!(
+            merge_regions(&["chr1:1-100", ""]),
+            Err(ArrowError::InvalidArgumentError(_))
+        ));
+    }
+
+    #[test]
+    fn test_already_returned() {
+        let position = |n| Position::new(n);
+        assert!(already_returned(position(50), position(100)));
+        assert!(already_returned(position(100), position(100)));
+        assert!(!already_returned(position(101), position(100)));
+        assert!(!already_returned(position(50), None));
+    }
+}
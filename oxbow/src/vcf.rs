@@ -1,40 +1,91 @@
 use arrow::array::{
-    ArrayRef, Float32Builder, GenericStringBuilder, Int32Builder,
+    Array, ArrayRef, Float32Builder, GenericStringBuilder, Int32Builder,
     StringArray, StringDictionaryBuilder,
 };
 use arrow::{
-    datatypes::Int32Type, error::ArrowError, record_batch::RecordBatch,
+    datatypes::{DataType, Field, Int32Type, Schema, SchemaRef},
+    error::ArrowError,
+    ipc::CompressionType,
+    record_batch::RecordBatch,
 };
-use noodles::core::Region;
-use noodles::{tabix, vcf};
+use noodles::core::Position;
+use noodles::csi::BinningIndex;
+use noodles::vcf::record::Chromosome;
+use noodles::{bgzf, tabix, vcf};
+use std::collections::HashSet;
+use std::fmt::Write;
+use std::num::NonZeroUsize;
 use std::sync::Arc;
 
-use crate::batch_builder::{write_ipc, BatchBuilder};
+use crate::batch_builder::{write_ipc, BatchBuilder, IpcWriter, INITIAL_CAPACITY};
+use crate::region::{already_returned, merge_regions, parse_region, query_error};
 
 type BufferedReader = std::io::BufReader<std::fs::File>;
 
 /// A VCF reader.
 pub struct VcfReader {
-    reader: vcf::IndexedReader<BufferedReader>,
+    reader: vcf::Reader<bgzf::Reader<BufferedReader>>,
     header: vcf::Header,
+    index: tabix::Index,
+    contig_names: StringArray,
+    compression: Option<CompressionType>,
+    /// The position of the first record, right after the header.
+    first_record: bgzf::VirtualPosition,
 }
 
 impl VcfReader {
     /// Creates a VCF Reader.
     pub fn new(path: &str) -> std::io::Result<Self> {
-        let index = tabix::read(format!("{}.tbi", path))?;
         let file = std::fs::File::open(path)?;
         let bufreader = std::io::BufReader::with_capacity(1024 * 1024, file);
-        let mut reader = vcf::indexed_reader::Builder::default()
-            .set_index(index)
-            .build_from_reader(bufreader)?;
+        Self::from_bgzf_reader(path, bgzf::Reader::new(bufreader))
+    }
+
+    /// Creates a VCF reader that decompresses BGZF blocks on `worker_count` threads.
+    ///
+    /// See [`BamReader::with_worker_count`](crate::bam::BamReader::with_worker_count).
+    pub fn with_worker_count(path: &str, worker_count: NonZeroUsize) -> std::io::Result<Self> {
+        let file = std::fs::File::open(path)?;
+        let bufreader = std::io::BufReader::with_capacity(1024 * 1024, file);
+        Self::from_bgzf_reader(path, bgzf::Reader::with_worker_count(worker_count, bufreader))
+    }
+
+    fn from_bgzf_reader(
+        path: &str,
+        inner: bgzf::Reader<BufferedReader>,
+    ) -> std::io::Result<Self> {
+        let index = tabix::read(format!("{}.tbi", path))?;
+        let mut reader = vcf::Reader::new(inner);
         let header = reader.read_header()?;
-        Ok(Self { reader, header })
+        let first_record = reader.virtual_position();
+        let contig_names = indexed_contig_names(&header, &index);
+        Ok(Self {
+            reader,
+            header,
+            index,
+            contig_names,
+            compression: None,
+            first_record,
+        })
+    }
+
+    /// Sets the codec used to compress the IPC record batch buffers.
+    ///
+    /// See [`BamReader::set_compression`](crate::bam::BamReader::set_compression).
+    pub fn set_compression(&mut self, compression: Option<CompressionType>) {
+        self.compression = compression;
     }
 
     /// Returns the records in the given region as Apache Arrow IPC.
     ///
-    /// If the region is `None`, all records are returned.
+    /// If the region is `None`, all records are returned. If `fields` is given,
+    /// only those columns are returned. Records are still read in full; the
+    /// other columns are just never built. Columns keep the file format's field
+    /// order, whatever the order of `fields`.
+    ///
+    /// An unknown or empty `fields`, a malformed region or an unknown reference
+    /// sequence is an `ArrowError::InvalidArgumentError`. A read error is an
+    /// `ArrowError::IoError`.
     ///
     /// # Examples
     ///
@@ -42,91 +93,566 @@ impl VcfReader {
     /// use oxbow::vcf::VcfReader;
     ///
     /// let mut reader = VcfReader::new("sample.vcf.gz").unwrap();
-    /// let ipc = reader.records_to_ipc(Some("sq0:1-1000")).unwrap();
+    /// let ipc = reader.records_to_ipc(Some("sq0:1-1000"), None).unwrap();
+    /// let ipc = reader.records_to_ipc(None, Some(&["chrom", "pos", "ref", "alt"])).unwrap();
     /// ```
-    pub fn records_to_ipc(&mut self, region: Option<&str>) -> Result<Vec<u8>, ArrowError> {
-        let batch_builder = VcfBatchBuilder::new(1024, &self.header)?;
+    pub fn records_to_ipc(
+        &mut self,
+        region: Option<&str>,
+        fields: Option<&[&str]>,
+    ) -> Result<Vec<u8>, ArrowError> {
+        let batch_builder =
+            VcfBatchBuilder::new(INITIAL_CAPACITY, &self.contig_names, fields)?;
         if let Some(region) = region {
-            let region: Region = region.parse().unwrap();
+            let region = parse_region(region)?;
+            let query = self
+                .reader
+                .query(&self.header, &self.index, &region)
+                .map_err(query_error)?;
+            return write_ipc(query, batch_builder, self.compression);
+        }
+        // Earlier queries leave the stream anywhere, so rewind to the first record.
+        self.reader.seek(self.first_record)?;
+        let records = self.reader.records(&self.header);
+        write_ipc(records, batch_builder, self.compression)
+    }
+
+    /// Returns the records in each of the given regions as one Apache Arrow IPC file.
+    ///
+    /// Overlapping or adjacent regions on the same reference sequence are merged
+    /// first, and a record spanning the gap between two merged regions is only
+    /// returned for the first, so each record is returned once. Records are
+    /// grouped by reference sequence, in order of first appearance, and sorted by
+    /// position within each. Errors are reported as in `records_to_ipc`.
+    ///
+    /// # Examples
+    ///
+    /// ```no_run
+    /// use oxbow::vcf::VcfReader;
+    ///
+    /// let mut reader = VcfReader::new("sample.vcf.gz").unwrap();
+    /// let ipc = reader.regions_to_ipc(&["sq0:1-1000", "sq1:1-1000"], None).unwrap();
+    /// ```
+    pub fn regions_to_ipc(
+        &mut self,
+        regions: &[&str],
+        fields: Option<&[&str]>,
+    ) -> Result<Vec<u8>, ArrowError> {
+        let batch_builder =
+            VcfBatchBuilder::new(INITIAL_CAPACITY, &self.contig_names, fields)?;
+        let mut writer = IpcWriter::new(batch_builder, self.compression)?;
+        for (region, previous_end) in merge_regions(regions)? {
             let query = self
                 .reader
-                .query(&self.header, &region)
-                .unwrap()
-                .map(|r| r.unwrap());
-            return write_ipc(query, batch_builder);
+                .query(&self.header, &self.index, &region)
+                .map_err(query_error)?;
+            for record in query {
+                let record = record?;
+                if already_returned(Position::new(usize::from(record.position())), previous_end) {
+                    continue;
+                }
+                writer.push(&record)?;
+            }
         }
-        let records = self.reader.records(&self.header).map(|r| r.unwrap());
-        write_ipc(records, batch_builder)
+        writer.finish()
     }
 }
 
-struct VcfBatchBuilder {
-    chrom: StringDictionaryBuilder<Int32Type>,
-    pos: Int32Builder,
-    id: GenericStringBuilder<i32>,
-    ref_: GenericStringBuilder<i32>,
-    alt: GenericStringBuilder<i32>,
-    qual: Float32Builder,
-    filter: GenericStringBuilder<i32>,
-    info: GenericStringBuilder<i32>,
-    format: GenericStringBuilder<i32>,
+/// Returns the contig names used as the `chrom` dictionary.
+pub(crate) fn contig_names(header: &vcf::Header) -> StringArray {
+    StringArray::from(
+        header
+            .contigs()
+            .keys()
+            .map(|k| k.to_string())
+            .collect::<Vec<_>>(),
+    )
 }
 
-impl VcfBatchBuilder {
-    pub fn new(capacity: usize, header: &vcf::Header) -> Result<Self, ArrowError> {
-        let categories = StringArray::from(
-            header
-                .contigs()
-                .keys()
-                .map(|k| k.to_string())
-                .collect::<Vec<_>>(),
-        );
-        Ok(Self {
-            chrom: StringDictionaryBuilder::<Int32Type>::new_with_dictionary(
-                capacity,
-                &categories,
+/// Returns the header's contig names followed by any other reference sequence
+/// names in the tabix index.
+///
+/// `##contig` lines are optional in VCF, but every chromosome in the file is
+/// listed in its index, so the result covers every record.
+fn indexed_contig_names(header: &vcf::Header, index: &tabix::Index) -> StringArray {
+    let mut names: Vec<String> = header.contigs().keys().map(|k| k.to_string()).collect();
+    if let Some(index_header) = index.header() {
+        let mut seen: HashSet<String> = names.iter().cloned().collect();
+        for name in index_header.reference_sequence_names() {
+            if seen.insert(name.clone()) {
+                names.push(name.clone());
+            }
+        }
+    }
+    StringArray::from(names)
+}
+
+/// The variant columns shared by VCF and BCF, in output order.
+const VARIANT_FIELD_NAMES: [&str; 9] = [
+    // spec
+    "chrom", "pos", "id", "ref", "alt", "qual", "filter", "info", "format",
+];
+
+/// Returns the Arrow data type of a variant column.
+///
+/// `chrom` is dictionary-encoded over the known contigs, or plain strings if
+/// there are none (see `ChromBuilder`).
+fn variant_data_type(name: &str, categories: &StringArray) -> DataType {
+    match name {
+        "chrom" if categories.is_empty() => DataType::Utf8,
+        "chrom" => DataType::Dictionary(Box::new(DataType::Int32), Box::new(DataType::Utf8)),
+        "pos" => DataType::Int32,
+        "qual" => DataType::Float32,
+        "id" | "ref" | "alt" | "filter" | "info" | "format" => DataType::Utf8,
+        _ => unreachable!("unknown VCF field: {}", name),
+    }
+}
+
+/// Returns the schema of the variant record batches shared by VCF and BCF.
+///
+/// Only the given fields are included, or all fields if `fields` is `None`. The
+/// columns are always in `VARIANT_FIELD_NAMES` order. `categories` are the
+/// contig names that `chrom` is dictionary-encoded over.
+fn variant_schema(
+    fields: Option<&[&str]>,
+    categories: &StringArray,
+) -> Result<SchemaRef, ArrowError> {
+    if fields.map_or(false, |fields| fields.is_empty()) {
+        return Err(ArrowError::InvalidArgumentError(
+            "no VCF fields selected".to_string(),
+        ));
+    }
+    if let Some(field) = fields
+        .unwrap_or_default()
+        .iter()
+        .find(|field| !VARIANT_FIELD_NAMES.contains(*field))
+    {
+        return Err(ArrowError::InvalidArgumentError(format!(
+            "invalid VCF field: {}",
+            field
+        )));
+    }
+    let schema = Schema::new(
+        VARIANT_FIELD_NAMES
+            .iter()
+            .filter(|name| is_selected(fields, name))
+            .map(|name| Field::new(*name, variant_data_type(name, categories), true))
+            .collect::<Vec<_>>(),
+    );
+    Ok(Arc::new(schema))
+}
+
+/// Returns whether the named column is among `fields`, or `true` if `fields` is `None`.
+fn is_selected(fields: Option<&[&str]>, name: &str) -> bool {
+    fields.map_or(true, |fields| fields.iter().any(|field| *field == name))
+}
+
+/// Builds the `chrom` column.
+///
+/// With known contigs, the column is dictionary-encoded and the dictionary is
+/// reseeded with all of them after every batch, because the IPC file format
+/// requires every batch to share the same dictionary. Without any, the column
+/// is written as plain strings.
+enum ChromBuilder<'a> {
+    Dictionary {
+        builder: StringDictionaryBuilder<Int32Type>,
+        categories: &'a StringArray,
+        capacity: usize,
+    },
+    Plain(GenericStringBuilder<i32>),
+}
+
+impl<'a> ChromBuilder<'a> {
+    fn new(capacity: usize, categories: &'a StringArray) -> Result<Self, ArrowError> {
+        if categories.is_empty() {
+            return Ok(Self::Plain(GenericStringBuilder::<i32>::new()));
+        }
+        Ok(Self::Dictionary {
+            builder: StringDictionaryBuilder::<Int32Type>::new_with_dictionary(
+                capacity, categories,
             )?,
-            pos: Int32Builder::with_capacity(capacity),
-            id: GenericStringBuilder::<i32>::new(),
-            ref_: GenericStringBuilder::<i32>::new(),
-            alt: GenericStringBuilder::<i32>::new(),
-            qual: Float32Builder::with_capacity(capacity),
-            filter: GenericStringBuilder::<i32>::new(),
-            info: GenericStringBuilder::<i32>::new(),
-            format: GenericStringBuilder::<i32>::new(),
+            categories,
+            capacity,
         })
     }
+
+    fn append(&mut self, chromosome: &Chromosome) {
+        match self {
+            // Only symbolic chromosomes need formatting (`<symbol>`); names are
+            // looked up in the dictionary as they are.
+            Self::Dictionary { builder, .. } => match chromosome {
+                Chromosome::Name(name) => builder.append_value(name),
+                Chromosome::Symbol(_) => builder.append_value(chromosome.to_string()),
+            },
+            Self::Plain(builder) => {
+                write!(builder, "{}", chromosome).unwrap();
+                builder.append_value("");
+            }
+        }
+    }
+
+    fn finish(&mut self) -> Result<ArrayRef, ArrowError> {
+        match self {
+            Self::Dictionary {
+                builder,
+                categories,
+                capacity,
+            } => {
+                let array = builder.finish();
+                // A chromosome outside the categories grows the dictionary, which
+                // would break the next batch.
+                if array.values().len() != categories.len() {
+                    return Err(ArrowError::InvalidArgumentError(
+                        "chromosome not found in the header contigs or index".to_string(),
+                    ));
+                }
+                *builder = StringDictionaryBuilder::<Int32Type>::new_with_dictionary(
+                    *capacity,
+                    *categories,
+                )?;
+                Ok(Arc::new(array))
+            }
+            Self::Plain(builder) => Ok(Arc::new(builder.finish())),
+        }
+    }
 }
 
-impl BatchBuilder for VcfBatchBuilder {
+/// Builds record batches from VCF records.
+///
+/// Only the selected columns are built; the builders of unselected fields are `None`.
+pub(crate) struct VcfBatchBuilder<'a> {
+    chrom: Option<ChromBuilder<'a>>,
+    pos: Option<Int32Builder>,
+    id: Option<GenericStringBuilder<i32>>,
+    ref_: Option<GenericStringBuilder<i32>>,
+    alt: Option<GenericStringBuilder<i32>>,
+    qual: Option<Float32Builder>,
+    filter: Option<GenericStringBuilder<i32>>,
+    info: Option<GenericStringBuilder<i32>>,
+    format: Option<GenericStringBuilder<i32>>,
+    schema: SchemaRef,
+}
+
+impl<'a> VcfBatchBuilder<'a> {
+    /// Creates a batch builder for the given fields, or for all fields if `fields` is `None`.
+    pub fn new(
+        capacity: usize,
+        categories: &'a StringArray,
+        fields: Option<&[&str]>,
+    ) -> Result<Self, ArrowError> {
+        let schema = variant_schema(fields, categories)?;
+        let selected = |name: &str| is_selected(fields, name);
+        Ok(Self {
+            chrom: selected("chrom")
+                .then(|| ChromBuilder::new(capacity, categories))
+                .transpose()?,
+            pos: selected("pos").then(|| Int32Builder::with_capacity(capacity)),
+            id: selected("id").then(GenericStringBuilder::<i32>::new),
+            ref_: selected("ref").then(GenericStringBuilder::<i32>::new),
+            alt: selected("alt").then(GenericStringBuilder::<i32>::new),
+            qual: selected("qual").then(|| Float32Builder::with_capacity(capacity)),
+            filter: selected("filter").then(GenericStringBuilder::<i32>::new),
+            info: selected("info").then(GenericStringBuilder::<i32>::new),
+            format: selected("format").then(GenericStringBuilder::<i32>::new),
+            schema,
+        })
+    }
+}
+
+impl<'a> BatchBuilder for VcfBatchBuilder<'a> {
     type Record = vcf::record::Record;
 
-    fn push(&mut self, record: &Self::Record) {
-        self.chrom.append_value(record.chromosome().to_string());
-        self.pos.append_value(usize::from(record.position()) as i32);
-        self.id.append_value(record.ids().to_string());
-        self.ref_.append_value(record.reference_bases().to_string());
-        self.alt.append_value(record.alternate_bases().to_string());
-        self.qual
-            .append_option(record.quality_score().map(f32::from));
-        self.filter
-            .append_option(record.filters().map(|f| f.to_string()));
-        self.info.append_value(record.info().to_string());
-        self.format.append_value(record.format().to_string());
-    }
-
-    fn finish(mut self) -> Result<RecordBatch, ArrowError> {
-        RecordBatch::try_from_iter(vec![
-            // spec
-            ("chrom", Arc::new(self.chrom.finish()) as ArrayRef),
-            ("pos", Arc::new(self.pos.finish()) as ArrayRef),
-            ("id", Arc::new(self.id.finish()) as ArrayRef),
-            ("ref", Arc::new(self.ref_.finish()) as ArrayRef),
-            ("alt", Arc::new(self.alt.finish()) as ArrayRef),
-            ("qual", Arc::new(self.qual.finish()) as ArrayRef),
-            ("filter", Arc::new(self.filter.finish()) as ArrayRef),
-            ("info", Arc::new(self.info.finish()) as ArrayRef),
-            ("format", Arc::new(self.format.finish()) as ArrayRef),
-        ])
+    fn push(&mut self, record: &Self::Record) -> Result<(), ArrowError> {
+        if let Some(chrom) = &mut self.chrom {
+            chrom.append(record.chromosome());
+        }
+        if let Some(pos) = &mut self.pos {
+            pos.append_value(usize::from(record.position()) as i32);
+        }
+        // Formatted fields are written straight into the builder's value buffer and
+        // committed with an empty `append_value`, avoiding a `String` per record.
+        if let Some(id) = &mut self.id {
+            write!(id, "{}", record.ids()).unwrap();
+            id.append_value("");
+        }
+        if let Some(ref_) = &mut self.ref_ {
+            write!(ref_, "{}", record.reference_bases()).unwrap();
+            ref_.append_value("");
+        }
+        if let Some(alt) = &mut self.alt {
+            write!(alt, "{}", record.alternate_bases()).unwrap();
+            alt.append_value("");
+        }
+        if let Some(qual) = &mut self.qual {
+            qual.append_option(record.quality_score().map(f32::from));
+        }
+        if let Some(filter) = &mut self.filter {
+            match record.filters() {
+                Some(filters) => {
+                    write!(filter, "{}", filters).unwrap();
+                    filter.append_value("");
+                }
+                None => filter.append_null(),
+            }
+        }
+        if let Some(info) = &mut self.info {
+            write!(info, "{}", record.info()).unwrap();
+            info.append_value("");
+        }
+        if let Some(format) = &mut self.format {
+            write!(format, "{}", record.format()).unwrap();
+            format.append_value("");
+        }
+        Ok(())
+    }
+
+    fn finish(&mut self) -> Result<RecordBatch, ArrowError> {
+        let mut columns: Vec<ArrayRef> = Vec::with_capacity(self.schema.fields().len());
+        // spec
+        if let Some(chrom) = &mut self.chrom {
+            columns.push(chrom.finish()?);
+        }
+        if let Some(pos) = &mut self.pos {
+            columns.push(Arc::new(pos.finish()) as ArrayRef);
+        }
+        if let Some(id) = &mut self.id {
+            columns.push(Arc::new(id.finish()) as ArrayRef);
+        }
+        if let Some(ref_) = &mut self.ref_ {
+            columns.push(Arc::new(ref_.finish()) as ArrayRef);
+        }
+        if let Some(alt) = &mut self.alt {
+            columns.push(Arc::new(alt.finish()) as ArrayRef);
+        }
+        if let Some(qual) = &mut self.qual {
+            columns.push(Arc::new(qual.finish()) as ArrayRef);
+        }
+        if let Some(filter) = &mut self.filter {
+            columns.push(Arc::new(filter.finish()) as ArrayRef);
+        }
+        if let Some(info) = &mut self.info {
+            columns.push(Arc::new(info.finish()) as ArrayRef);
+        }
+        if let Some(format) = &mut self.format {
+            columns.push(Arc::new(format.finish()) as ArrayRef);
+        }
+        RecordBatch::try_new(self.schema.clone(), columns)
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+    use crate::batch_builder::BATCH_SIZE;
+    use arrow::array::DictionaryArray;
+    use arrow::ipc::reader::FileReader;
+    use noodles::vcf::record::Position;
+
+    // sample.vcf.gz declares sq0 in its header, but sq1 only appears in the index
+    fn sample_path() -> String {
+        let mut dir = std::path::PathBuf::from(env!("CARGO_MANIFEST_DIR"));
+        dir.push("fixtures/sample.vcf.gz");
+        dir.to_str().unwrap().to_string()
+    }
+
+    fn sample_reader() -> VcfReader {
+        VcfReader::new(&sample_path()).unwrap()
+    }
+
+    fn read_record_batch(ipc: Vec<u8>) -> RecordBatch {
+        let cursor = std::io::Cursor::new(ipc);
+        let mut arrow_reader = FileReader::try_new(cursor, None).unwrap();
+        // make sure we have one batch
+        assert_eq!(arrow_reader.num_batches(), 1);
+        arrow_reader.next().unwrap().unwrap()
+    }
+
+    fn field_names(schema: &Schema) -> Vec<&str> {
+        schema.fields().iter().map(|f| f.name().as_str()).collect()
+    }
+
+    fn record(chrom: &str, pos: usize) -> vcf::Record {
+        vcf::Record::builder()
+            .set_chromosome(chrom.parse().unwrap())
+            .set_position(Position::from(pos))
+            .set_reference_bases("A".parse().unwrap())
+            .build()
+            .unwrap()
+    }
+
+    fn read_batches(categories: &StringArray, records: Vec<vcf::Record>) -> Vec<RecordBatch> {
+        let batch_builder =
+            VcfBatchBuilder::new(INITIAL_CAPACITY, categories, Some(&["chrom", "pos"])).unwrap();
+        let ipc = write_ipc(records.into_iter().map(Ok), batch_builder, None).unwrap();
+        let cursor = std::io::Cursor::new(ipc);
+        FileReader::try_new(cursor, None)
+            .unwrap()
+            .map(|batch| batch.unwrap())
+            .collect()
+    }
+
+    #[test]
+    fn test_chrom_without_contigs() {
+        // no ##contig lines, and the second chromosome only appears in the second batch
+        let categories = StringArray::from(Vec::<String>::new());
+        let records = (1..=BATCH_SIZE)
+            .map(|pos| record("sq0", pos))
+            .chain((1..=10).map(|pos| record("sq1", pos)))
+            .collect();
+        let batches = read_batches(&categories, records);
+        let num_rows: Vec<_> = batches.iter().map(|batch| batch.num_rows()).collect();
+        assert_eq!(num_rows, vec![BATCH_SIZE, 10]);
+        assert_eq!(batches[0].schema().field(0).data_type(), &DataType::Utf8);
+        let chrom = batches[1]
+            .column(0)
+            .as_any()
+            .downcast_ref::<StringArray>()
+            .unwrap();
+        assert_eq!(chrom.value(0), "sq1");
+    }
+
+    #[test]
+    fn test_chrom_with_contigs() {
+        let categories = StringArray::from(vec!["sq0", "sq1"]);
+        let records = (1..=BATCH_SIZE)
+            .map(|pos| record("sq0", pos))
+            .chain((1..=10).map(|pos| record("sq1", pos)))
+            .collect();
+        let batches = read_batches(&categories, records);
+        let num_rows: Vec<_> = batches.iter().map(|batch| batch.num_rows()).collect();
+        assert_eq!(num_rows, vec![BATCH_SIZE, 10]);
+        assert!(matches!(
+            batches[0].schema().field(0).data_type(),
+            DataType::Dictionary(_, _)
+        ));
+    }
+
+    #[test]
+    fn test_chrom_not_in_contigs() {
+        let categories = StringArray::from(vec!["sq0"]);
+        let mut batch_builder = VcfBatchBuilder::new(INITIAL_CAPACITY, &categories, None).unwrap();
+        batch_builder.push(&record("sq1", 1)).unwrap();
+        assert!(batch_builder.finish().is_err());
+    }
+
+    #[test]
+    fn test_variant_schema() {
+        let categories = StringArray::from(vec!["sq0"]);
+        let schema = variant_schema(None, &categories).unwrap();
+        assert_eq!(field_names(&schema), VARIANT_FIELD_NAMES);
+        // columns keep the VCF field order
+        let schema = variant_schema(Some(&["alt", "chrom", "pos"]), &categories).unwrap();
+        assert_eq!(field_names(&schema), vec!["chrom", "pos", "alt"]);
+    }
+
+    #[test]
+    fn test_variant_schema_invalid() {
+        let categories = StringArray::from(vec!["sq0"]);
+        assert!(variant_schema(Some(&["nope"]), &categories).is_err());
+        assert!(variant_schema(Some(&[]), &categories).is_err());
+    }
+
+    #[test]
+    fn test_read_all() {
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+        let chrom = record_batch
+            .column(0)
+            .as_any()
+            .downcast_ref::<DictionaryArray<Int32Type>>()
+            .unwrap();
+        let values = chrom
+            .values()
+            .as_any()
+            .downcast_ref::<StringArray>()
+            .unwrap();
+        assert_eq!(values.iter().collect::<Vec<_>>(), vec![Some("sq0"), Some("sq1")]);
+    }
+
+    #[test]
+    fn test_region() {
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(Some("sq1"), None).unwrap());
+        assert_eq!(record_batch.num_rows(), 2);
+        let record_batch =
+            read_record_batch(reader.records_to_ipc(Some("sq0:50-150"), None).unwrap());
+        assert_eq!(record_batch.num_rows(), 1);
+    }
+
+    #[test]
+    fn test_fields() {
+        let mut reader = sample_reader();
+        let ipc = reader
+            .records_to_ipc(Some("sq1"), Some(&["filter", "chrom", "pos"]))
+            .unwrap();
+        let record_batch = read_record_batch(ipc);
+        assert_eq!(field_names(&record_batch.schema()), vec!["chrom", "pos", "filter"]);
+        let filter = record_batch
+            .column(2)
+            .as_any()
+            .downcast_ref::<StringArray>()
+            .unwrap();
+        assert_eq!(filter.iter().collect::<Vec<_>>(), vec![Some("q10"), Some("PASS")]);
+    }
+
+    #[test]
+    fn test_regions() {
+        let mut reader = sample_reader();
+        // the deletion at sq0:100-109 spans the gap between the regions
+        let ipc = reader
+            .regions_to_ipc(&["sq0:105-200", "sq0:1-102", "sq1"], None)
+            .unwrap();
+        let record_batch = read_record_batch(ipc);
+        assert_eq!(record_batch.num_rows(), 4);
+    }
+
+    #[test]
+    fn test_read_with_worker_count() {
+        let worker_count = NonZeroUsize::new(2).unwrap();
+        let mut reader = VcfReader::with_worker_count(&sample_path(), worker_count).unwrap();
+        let record_batch = read_record_batch(reader.records_to_ipc(Some("sq0"), None).unwrap());
+        assert_eq!(record_batch.num_rows(), 3);
+    }
+
+    #[test]
+    fn test_compression() {
+        let mut reader = sample_reader();
+        reader.set_compression(Some(CompressionType::LZ4_FRAME));
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+    }
+
+    #[test]
+    fn test_read_all_twice() {
+        let mut reader = sample_reader();
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+    }
+
+    #[test]
+    fn test_read_all_after_region() {
+        let mut reader = sample_reader();
+        let ipc = reader.records_to_ipc(Some("sq0:50-150"), None).unwrap();
+        assert_eq!(read_record_batch(ipc).num_rows(), 1);
+        let record_batch = read_record_batch(reader.records_to_ipc(None, None).unwrap());
+        assert_eq!(record_batch.num_rows(), 5);
+    }
+
+    #[test]
+    fn test_invalid_region() {
+        let mut reader = sample_reader();
+        for region in ["", "sq99"] {
+            assert!(matches!(
+                reader.records_to_ipc(Some(region), None),
+                Err(ArrowError::InvalidArgumentError(_))
+            ));
+            assert!(matches!(
+                reader.regions_to_ipc(&[region], None),
+                Err(ArrowError::InvalidArgumentError(_))
+            ));
+        }
     }
 }
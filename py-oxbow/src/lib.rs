@@ -1,36 +1,173 @@
+use pyo3::exceptions::{PyIOError, PyRuntimeError, PyValueError};
 use pyo3::prelude::*;
 use pyo3::types::PyBytes;
+use std::num::NonZeroUsize;
 
 use oxbow::bam::BamReader;
 use oxbow::vcf::VcfReader;
 use oxbow::bcf::BcfReader;
+use oxbow::{ArrowError, CompressionType};
 
-#[pyfunction]
-fn read_bam(path: &str, region: Option<&str>) -> PyObject {
-    let mut reader = BamReader::new(path).unwrap();
-    let ipc = reader.records_to_ipc(region).unwrap();
-    Python::with_gil(|py| PyBytes::new(py, &ipc).into())
+#[cfg(feature = "mimalloc")]
+#[global_allocator]
+static GLOBAL: mimalloc::MiMalloc = mimalloc::MiMalloc;
+
+/// Parses the name of an IPC compression codec: "lz4", "zstd" or `None`.
+fn ipc_compression(name: Option<&str>) -> PyResult<Option<CompressionType>> {
+    match name {
+        None => Ok(None),
+        Some("lz4") => Ok(Some(CompressionType::LZ4_FRAME)),
+        Some("zstd") => Ok(Some(CompressionType::ZSTD)),
+        Some(name) => Err(PyValueError::new_err(format!(
+            "invalid compression: {} (expected \"lz4\" or \"zstd\")",
+            name
+        ))),
+    }
+}
+
+/// Converts an error from building the IPC output into a Python exception.
+///
+/// Invalid arguments, such as an unknown or empty list of fields, a malformed
+/// region or an unknown reference sequence, are raised as `ValueError`, and read
+/// errors as `OSError`.
+fn ipc_error(err: ArrowError) -> PyErr {
+    match err {
+        ArrowError::InvalidArgumentError(msg) => PyValueError::new_err(msg),
+        ArrowError::IoError(msg) => PyIOError::new_err(msg),
+        err => PyRuntimeError::new_err(err.to_string()),
+    }
+}
+
+/// Defines the Python bindings of one reader type:
+///
+/// - `$open`, which opens a reader, decompressing on `threads` workers when
+///   `threads > 1` and raising I/O errors (e.g. a missing file or index) as `OSError`
+/// - the `$read` module function, which reads a file in one call
+/// - the `$class` Python class, which keeps the reader open between queries
+macro_rules! reader_bindings {
+    (
+        format: $format:tt,
+        reader: $reader:ident,
+        open: $open:ident,
+        read: $read:ident,
+        class: $class:ident,
+        name: $name:tt,
+    ) => {
+        #[doc = concat!("Opens a ", $format, " reader.")]
+        fn $open(path: &str, threads: usize) -> PyResult<$reader> {
+            let reader = match NonZeroUsize::new(threads) {
+                Some(worker_count) if threads > 1 => {
+                    $reader::with_worker_count(path, worker_count)?
+                }
+                _ => $reader::new(path)?,
+            };
+            Ok(reader)
+        }
+
+        #[pyfunction]
+        #[pyo3(signature = (path, region=None, fields=None, threads=1, compression=None))]
+        fn $read(
+            py: Python,
+            path: &str,
+            region: Option<&str>,
+            fields: Option<Vec<&str>>,
+            threads: usize,
+            compression: Option<&str>,
+        ) -> PyResult<PyObject> {
+            let compression = ipc_compression(compression)?;
+            let ipc = py.allow_threads(|| -> PyResult<Vec<u8>> {
+                let mut reader = $open(path, threads)?;
+                reader.set_compression(compression);
+                reader.records_to_ipc(region, fields.as_deref()).map_err(ipc_error)
+            })?;
+            Ok(PyBytes::new(py, &ipc).into())
+        }
+
+        #[doc = concat!(
+            "A ", $format, " reader that keeps the header and index loaded between queries."
+        )]
+        #[pyclass(name = $name)]
+        struct $class {
+            reader: $reader,
+        }
+
+        #[pymethods]
+        impl $class {
+            #[new]
+            #[pyo3(signature = (path, threads=1, compression=None))]
+            fn new(path: &str, threads: usize, compression: Option<&str>) -> PyResult<Self> {
+                let mut reader = $open(path, threads)?;
+                reader.set_compression(ipc_compression(compression)?);
+                Ok(Self { reader })
+            }
+
+            #[pyo3(signature = (region=None, fields=None))]
+            fn records_to_ipc(
+                &mut self,
+                py: Python,
+                region: Option<&str>,
+                fields: Option<Vec<&str>>,
+            ) -> PyResult<PyObject> {
+                let reader = &mut self.reader;
+                let ipc = py.allow_threads(|| {
+                    reader.records_to_ipc(region, fields.as_deref()).map_err(ipc_error)
+                })?;
+                Ok(PyBytes::new(py, &ipc).into())
+            }
+
+            #[pyo3(signature = (regions, fields=None))]
+            fn regions_to_ipc(
+                &mut self,
+                py: Python,
+                regions: Vec<&str>,
+                fields: Option<Vec<&str>>,
+            ) -> PyResult<PyObject> {
+                let reader = &mut self.reader;
+                let ipc = py.allow_threads(|| {
+                    reader.regions_to_ipc(&regions, fields.as_deref()).map_err(ipc_error)
+                })?;
+                Ok(PyBytes::new(py, &ipc).into())
+            }
+        }
+    };
+}
+
+reader_bindings! {
+    format: "BAM",
+    reader: BamReader,
+    open: open_bam,
+    read: read_bam,
+    class: PyBamReader,
+    name: "BamReader",
 }
 
-#[pyfunction]
-fn read_vcf(path: &str, region: Option<&str>) -> PyObject {
-    let mut reader = VcfReader::new(path).unwrap();
-    let ipc = reader.records_to_ipc(region).unwrap();
-    Python::with_gil(|py| PyBytes::new(py, &ipc).into())
+reader_bindings! {
+    format: "VCF",
+    reader: VcfReader,
+    open: open_vcf,
+    read: read_vcf,
+    class: PyVcfReader,
+    name: "VcfReader",
 }
 
-#[pyfunction]
-fn read_bcf(path: &str, region: Option<&str>) -> PyObject {
-    let mut reader = BcfReader::new(path).unwrap();
-    let ipc = reader.records_to_ipc(region).unwrap();
-    Python::with_gil(|py| PyBytes::new(py, &ipc).into())
+reader_bindings! {
+    format: "BCF",
+    reader: BcfReader,
+    open: open_bcf,
+    read: read_bcf,
+    class: PyBcfReader,
+    name: "BcfReader",
 }
 
 #[pymodule]
 #[pyo3(name = "oxbow")]
 fn py_oxbow(_py: Python, m: &PyModule) -> PyResult<()> {
+    m.add("__version__", env!("CARGO_PKG_VERSION"))?;
     m.add_function(wrap_pyfunction!(read_bam, m)?)?;
     m.add_function(wrap_pyfunction!(read_vcf, m)?)?;
     m.add_function(wrap_pyfunction!(read_bcf, m)?)?;
+    m.add_class::<PyBamReader>()?;
+    m.add_class::<PyVcfReader>()?;
+    m.add_class::<PyBcfReader>()?;
     Ok(())
 }
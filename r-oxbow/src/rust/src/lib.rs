@@ -8,7 +8,7 @@ use oxbow::bcf::BcfReader;
 #[extendr]
 fn read_bam(path: &str, region: Option<&str>) -> Vec<u8> {
     let mut reader = BamReader::new(path).unwrap();
-    reader.records_to_ipc(region).unwrap()
+    reader.records_to_ipc(region, None).unwrap()
 }
 
 /// Return Arrow IPC format from a VCF file.
@@ -16,7 +16,7 @@ fn read_bam(path: &str, region: Option<&str>) -> Vec<u8> {
 #[extendr]
 fn read_vcf(path: &str, region: Option<&str>) -> Vec<u8> {
     let mut reader = VcfReader::new(path).unwrap();
-    reader.records_to_ipc(region).unwrap()
+    reader.records_to_ipc(region, None).unwrap()
 }
 
 /// Return Arrow IPC format from a BCF file.
@@ -24,7 +24,7 @@ fn read_vcf(path: &str, region: Option<&str>) -> Vec<u8> {
 #[extendr]
 fn read_bcf(path: &str, region: Option<&str>) -> Vec<u8> {
     let mut reader = BcfReader::new(path).unwrap();
-    reader.records_to_ipc(region).unwrap()
+    reader.records_to_ipc(region, None).unwrap()
 }
 
 // Macro to generate exports.